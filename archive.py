@@ -0,0 +1,198 @@
+# ============================================
+# 🗄️ أرشفة الطلبات المنتهية - archive.py
+# نقل الطلبات المقبولة/المرفوضة القديمة إلى ملفات شهرية مضغوطة
+# ============================================
+#
+# كل شهر له ملف مستقل بصيغة JSONL مضغوط بـ gzip (إضافة فقط):
+#     archive/requests_2026-01.jsonl.gz
+# كل عملية أرشفة تضيف "عضو" gzip جديد في نهاية الملف، ويُحفظ موضع بدايته
+# في ملف فهرس صغير (archive/index.json) حتى نتمكن من قراءة الطلب مباشرة
+# دون فك ضغط الملف كاملاً.
+#
+# ملاحظة: الإحصائيات في db["statistics"] عدادات تراكمية لا تُحسب من
+# db["requests"]، لذلك لا تتأثر بنقل الطلبات إلى الأرشيف.
+
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+
+from config import ARCHIVE_DIR
+
+logger = logging.getLogger(__name__)
+
+# صيغة التاريخ المستخدمة في حقل timestamp للطلبات
+TIMESTAMP_FORMAT = "%Y-%m-%d | %H:%M:%S"
+
+# الحالات النهائية التي يمكن أرشفتها
+FINAL_STATUSES = ("accepted", "rejected")
+
+INDEX_FILE = os.path.join(ARCHIVE_DIR, "index.json")
+
+# نسخة من الفهرس في الذاكرة لتجنب قراءة الملف عند كل استعلام
+_index_cache: dict | None = None
+
+
+# ============================================
+# 📑 الفهرس الجانبي
+# ============================================
+
+def _segment_path(month: str) -> str:
+    """مسار ملف الأرشيف الخاص بشهر معين (YYYY-MM)."""
+    return os.path.join(ARCHIVE_DIR, f"requests_{month}.jsonl.gz")
+
+
+def load_index() -> dict:
+    """تحميل فهرس الأرشيف: request_id -> [الشهر, موضع بداية العضو]."""
+    global _index_cache
+    if _index_cache is not None:
+        return _index_cache
+    if not os.path.exists(INDEX_FILE):
+        _index_cache = {}
+        return _index_cache
+    try:
+        with open(INDEX_FILE, "r", encoding="utf-8") as f:
+            _index_cache = json.load(f)
+    except (json.JSONDecodeError, OSError) as e:
+        logger.error("❌ خطأ في قراءة فهرس الأرشيف: %s", e)
+        _index_cache = {}
+    return _index_cache
+
+
+def _save_index(index: dict) -> None:
+    """حفظ الفهرس بشكل ذري (ملف مؤقت ثم استبدال)."""
+    tmp_path = INDEX_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, INDEX_FILE)
+
+
+# ============================================
+# 📦 الكتابة إلى الأرشيف
+# ============================================
+
+def _parse_timestamp(request_data: dict) -> datetime | None:
+    """استخراج تاريخ الطلب، أو None إذا كان غير صالح."""
+    try:
+        return datetime.strptime(request_data["timestamp"], TIMESTAMP_FORMAT)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _append_segment(month: str, records: list[tuple[str, dict]]) -> int:
+    """
+    إضافة مجموعة طلبات إلى ملف الشهر كعضو gzip جديد.
+    تُرجع موضع بداية العضو داخل الملف.
+    """
+    with open(_segment_path(month), "ab") as f:
+        offset = f.tell()
+        with gzip.GzipFile(fileobj=f, mode="wb") as gz:
+            for request_id, request_data in records:
+                line = json.dumps({"id": request_id, "data": request_data}, ensure_ascii=False)
+                gz.write(line.encode("utf-8") + b"\n")
+        f.flush()
+        os.fsync(f.fileno())
+    return offset
+
+
+def _is_reconciled(request_data: dict) -> bool:
+    """
+    هل رسالة القناة مطابقة لحالة الطلب وتم تسليم أكواده؟
+    الطلبات التي لم تتم تسويتها تبقى في db حتى تعالجها التسوية أو /refresh،
+    لأن التسوية لا تمر على الأرشيف والتعديل على الطلب المؤرشف لا يُحفظ.
+    """
+    if request_data.get("delivery") == "failed" or request_data.get("codes_delivery") == "failed":
+        return False
+    return not (
+        request_data.get("channel_message_id")
+        and request_data.get("rendered_status") != request_data.get("status")
+    )
+
+
+def archive_requests(db: dict, max_age_days: int) -> int:
+    """
+    نقل الطلبات المنتهية الأقدم من max_age_days من db["requests"] إلى الأرشيف.
+    - الطلبات التي لم تتم تسويتها بعد لا تُؤرشف.
+    - يتم تعديل db في الذاكرة فقط، والحفظ مسؤولية المستدعي.
+    - تُرجع عدد الطلبات التي تمت أرشفتها.
+    """
+    cutoff = datetime.now() - timedelta(days=max_age_days)
+
+    # تجميع الطلبات المؤهلة حسب الشهر
+    by_month: dict[str, list[tuple[str, dict]]] = {}
+    for request_id, request_data in db["requests"].items():
+        if request_data.get("status") not in FINAL_STATUSES or not _is_reconciled(request_data):
+            continue
+        created_at = _parse_timestamp(request_data)
+        if created_at is None or created_at >= cutoff:
+            continue
+        by_month.setdefault(created_at.strftime("%Y-%m"), []).append((request_id, request_data))
+
+    if not by_month:
+        return 0
+
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    index = load_index()
+
+    # الترتيب مهم: الكتابة في الملف الشهري أولاً، ثم الفهرس، ثم الحذف من db.
+    # إذا توقف البرنامج في المنتصف يبقى الطلب في db ويُعاد أرشفته لاحقاً.
+    archived = 0
+    for month, records in sorted(by_month.items()):
+        offset = _append_segment(month, records)
+        for request_id, _ in records:
+            index[request_id] = [month, offset]
+        archived += len(records)
+    _save_index(index)
+
+    for records in by_month.values():
+        for request_id, _ in records:
+            del db["requests"][request_id]
+
+    logger.info("🗄️ تمت أرشفة %s طلب في %s ملف شهري", archived, len(by_month))
+    return archived
+
+
+# ============================================
+# 🔍 القراءة من الأرشيف
+# ============================================
+
+def get_archived_request(request_id: str) -> dict | None:
+    """البحث عن طلب مؤرشف عبر الفهرس، وقراءة العضو الخاص به فقط."""
+    entry = load_index().get(request_id)
+    if entry is None:
+        return None
+    month, offset = entry
+    try:
+        with open(_segment_path(month), "rb") as f:
+            f.seek(offset)
+            with gzip.GzipFile(fileobj=f, mode="rb") as gz:
+                for line in gz:
+                    record = json.loads(line)
+                    if record["id"] == request_id:
+                        return record["data"]
+    except (OSError, EOFError, json.JSONDecodeError) as e:
+        logger.error(
+            "❌ خطأ في قراءة الطلب المؤرشف %s: %s", request_id, e, extra={"request_id": request_id}
+        )
+    return None
+
+
+def iter_archived_requests():
+    """المرور على جميع الطلبات المؤرشفة (id, data) مرة واحدة لكل طلب."""
+    index = load_index()
+    seen = set()
+    for month in sorted({entry[0] for entry in index.values()}):
+        try:
+            with gzip.open(_segment_path(month), "rb") as gz:
+                for line in gz:
+                    record = json.loads(line)
+                    # قد يتكرر الطلب إذا أُعيدت أرشفته، نعتمد الشهر المسجل في الفهرس فقط
+                    if record["id"] in seen or index.get(record["id"], [None])[0] != month:
+                        continue
+                    seen.add(record["id"])
+                    yield record["id"], record["data"]
+        except (OSError, EOFError, json.JSONDecodeError) as e:
+            logger.error("❌ خطأ في قراءة ملف الأرشيف %s: %s", month, e)
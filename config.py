@@ -18,6 +18,10 @@ ADMIN_ID = 7857570699
 # 📂 مسار ملف قاعدة البيانات
 DATABASE_FILE = "database.json"
 
+# 💾 صيغة حفظ قاعدة البيانات: "json" (مقروء) أو "fastjson" أو "msgpack"
+# (القراءة تتعرف على صيغة الملف تلقائياً، للتحويل: python serializers.py convert)
+DATABASE_FORMAT = "json"
+
 # 💬 رسالة الترحيب
 WELCOME_MESSAGE = (
     "━━━━━━━━━━━━━━━━━━━━━━\n"
@@ -33,3 +37,61 @@ WELCOME_MESSAGE = (
 
 # 🚫 رسالة غير المصرح لهم
 UNAUTHORIZED_MESSAGE = "Fuck You Bitch 😂"
+
+# 🗄️ مجلد أرشيف الطلبات المنتهية (مقبولة / مرفوضة)
+ARCHIVE_DIR = "archive"
+
+# ⏳ عدد الأيام التي يبقى بعدها الطلب المنتهي في قاعدة البيانات قبل أرشفته
+ARCHIVE_AFTER_DAYS = 30
+
+# ⏰ ملف المهام المجدولة
+JOBS_FILE = "jobs.json"
+
+# 🔔 إرسال تذكير في القناة للطلبات المعلقة منذ أكثر من هذا العدد من الساعات
+STALE_REQUEST_HOURS = 6
+
+# 📊 ساعة إرسال ملخص الإحصائيات اليومي للأدمن (0-23)
+DAILY_DIGEST_HOUR = 21
+
+# 🗜️ الفترة بين عمليات ضغط قاعدة البيانات (أرشفة الطلبات القديمة) بالساعات
+COMPACTION_INTERVAL_HOURS = 24
+
+# 📋 إعدادات التسجيل (Logging)
+LOG_LEVEL = "INFO"
+
+# 📁 ملف السجلات مع التدوير (None = الطرفية فقط)
+LOG_FILE = None
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+
+# 🎲 نسبة الرسائل التي يتم تسجيلها لكل logger مزعج (1.0 = الكل)
+LOG_SAMPLING = {"aiogram.event": 0.1}
+
+# 🚦 الحد الأقصى للرسائل المتكررة (مثل محاولات غير المصرح لهم): عدد الرسائل لكل فترة بالثواني
+LOG_RATE_LIMIT = (5, 60)
+
+# 🔁 منع تكرار معالجة التحديثات: الحجم الأقصى، مدة الصلاحية بالثواني، وملف الحفظ (None = بدون حفظ)
+DEDUP_CACHE_SIZE = 10000
+DEDUP_TTL_SECONDS = 24 * 3600
+DEDUP_FILE = "dedup.json"
+# كل كم ثانية يُحفظ ملف منع التكرار (حتى لا يضيع عند توقف البوت المفاجئ)
+DEDUP_SAVE_INTERVAL_SECONDS = 60
+
+# 🔬 إعدادات أمر /profile: المدة الافتراضية والقصوى بالثواني، وحد الـ callback البطيء بالملّي ثانية
+PROFILE_DEFAULT_SECONDS = 10
+PROFILE_MAX_SECONDS = 120
+PROFILE_SLOW_CALLBACK_MS = 100
+
+# 🔄 تسوية رسائل القناة عند التشغيل: عدد الرسائل في كل دفعة، والانتظار بين الدفعات بالثواني
+RECONCILE_BATCH_SIZE = 20
+RECONCILE_BATCH_DELAY = 1.0
+
+# 🔎 استعلام الطلاب عن حالة طلباتهم: الحد الأقصى للاستعلامات لكل مستخدم خلال الفترة (بالثواني)
+STATUS_LOOKUP_LIMIT = 5
+STATUS_LOOKUP_WINDOW = 60
+
+# 🎟️ مخزون الأكواد: تفعيل تخصيص الأكواد عند الموافقة، ملف المخزون، وحد التنبيه بانخفاض المخزون
+# (فعّل التخصيص فقط بعد استيراد الأكواد عبر /import_codes، وإلا ستُرفض كل الموافقات لعدم توفر المخزون)
+CODE_ALLOCATION_ENABLED = False
+CODES_FILE = "codes.json"
+CODES_LOW_STOCK_THRESHOLD = 20
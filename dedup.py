@@ -0,0 +1,81 @@
+# ============================================
+# 🔁 منع تكرار معالجة التحديثات - dedup.py
+# ذاكرة مؤقتة محدودة الحجم ومنتهية الصلاحية للمعرفات التي تمت معالجتها
+# ============================================
+
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class ExpiringSet:
+    """
+    مجموعة مفاتيح بحجم أقصى ومدة صلاحية ثابتة.
+    المفاتيح مرتبة حسب وقت الإضافة، لذلك أقدمها ينتهي أولاً ويُحذف من البداية.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items: OrderedDict[str, float] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _evict(self, now: float) -> None:
+        """حذف المفاتيح المنتهية والزائدة عن الحجم الأقصى."""
+        while self._items:
+            key, expires_at = next(iter(self._items.items()))
+            if expires_at > now and len(self._items) <= self.max_size:
+                break
+            self._items.popitem(last=False)
+
+    def check_and_add(self, key: str) -> bool:
+        """إرجاع True إذا كان المفتاح موجوداً مسبقاً، وإلا إضافته وإرجاع False."""
+        now = time.time()
+        expires_at = self._items.get(key)
+        if expires_at is not None and expires_at > now:
+            return True
+        self._items[key] = now + self.ttl
+        self._items.move_to_end(key)
+        self._evict(now)
+        return False
+
+    def discard(self, key: str) -> None:
+        """حذف مفتاح (مثلاً عند فشل المعالجة حتى تُقبل إعادة المحاولة)."""
+        self._items.pop(key, None)
+
+    # ============================================
+    # 💾 الحفظ بين مرات التشغيل
+    # ============================================
+
+    def load(self, path: str) -> None:
+        """تحميل المفاتيح غير المنتهية من ملف."""
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                items = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            logger.error("❌ خطأ في قراءة ملف منع التكرار: %s", e)
+            return
+        now = time.time()
+        for key, expires_at in items:
+            if expires_at > now:
+                self._items[key] = expires_at
+        self._evict(now)
+
+    def save(self, path: str) -> None:
+        """حفظ المفاتيح الحالية في ملف."""
+        self._evict(time.time())
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(list(self._items.items()), f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error("❌ خطأ في حفظ ملف منع التكرار: %s", e)
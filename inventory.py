@@ -0,0 +1,147 @@
+# ============================================
+# 🔑 مخزون الأكواد - inventory.py
+# استيراد الأكواد من ملفات، وتخصيصها للطلبات عند الموافقة
+# ============================================
+#
+# - لكل نوع أكواد (regular / english) قائمة بالأكواد المتوفرة وسجل بالأكواد المصروفة.
+# - التخصيص يأخذ الأكواد من نهاية القائمة: O(1) لكل كود.
+# - التخصيص "كل شيء أو لا شيء": إما أن تتوفر كل الأكواد المطلوبة للطلب أو لا يُصرف شيء.
+# - جميع العمليات متزامنة (بدون await)، لذلك لا يمكن لموافقتين متزامنتين داخل
+#   حلقة asyncio أن تتداخلا، ويُحفظ الملف قبل تسليم الأكواد لأي أحد.
+# - تكرار التخصيص لنفس الطلب يعيد نفس الأكواد ولا يصرف أكواداً جديدة.
+
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+POOLS = ("regular", "english")
+
+
+class CodeInventory:
+    """مخزون الأكواد المحفوظ في ملف JSON."""
+
+    def __init__(self, path: str, low_stock_threshold: int):
+        self.path = path
+        self.low_stock_threshold = low_stock_threshold
+        self._data = self._empty()
+        # كل الأكواد المعروفة (متوفرة أو مصروفة) لكل نوع، لمنع التكرار عند الاستيراد
+        self._known: dict[str, set[str]] = {pool: set() for pool in POOLS}
+
+    @staticmethod
+    def _empty() -> dict:
+        return {
+            "pools": {pool: {"available": [], "issued": {}} for pool in POOLS},
+            "allocations": {},
+            "low_stock_alerted": {pool: False for pool in POOLS},
+        }
+
+    # ============================================
+    # 💾 الحفظ والتحميل
+    # ============================================
+
+    def load(self) -> None:
+        """تحميل المخزون من الملف إن وجد."""
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._data = json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                # لا نستبدل الملف هنا حتى لا نفقد المخزون بسبب خطأ قراءة
+                logger.error("❌ خطأ في قراءة ملف مخزون الأكواد: %s", e)
+                raise
+        for pool in POOLS:
+            state = self._data["pools"][pool]
+            self._known[pool] = set(state["available"]) | set(state["issued"])
+
+    def _save(self) -> None:
+        """حفظ المخزون بشكل ذري (ملف مؤقت ثم استبدال)."""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._data, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    # ============================================
+    # 📥 الاستيراد والمخزون
+    # ============================================
+
+    def import_codes(self, pool: str, lines: list[str]) -> tuple[int, int]:
+        """
+        إضافة أكواد (كود في كل سطر) إلى المخزون.
+        تُرجع (عدد الأكواد المضافة، عدد المكرر أو المصروف مسبقاً).
+        """
+        known = self._known[pool]
+        available = self._data["pools"][pool]["available"]
+        added = skipped = 0
+        for line in lines:
+            code = line.strip()
+            if not code:
+                continue
+            if code in known:
+                skipped += 1
+                continue
+            known.add(code)
+            available.append(code)
+            added += 1
+        if added:
+            self._data["low_stock_alerted"][pool] = False
+            self._save()
+        return added, skipped
+
+    def remaining(self, pool: str) -> int:
+        """عدد الأكواد المتوفرة."""
+        return len(self._data["pools"][pool]["available"])
+
+    def issued(self, pool: str) -> int:
+        """عدد الأكواد المصروفة."""
+        return len(self._data["pools"][pool]["issued"])
+
+    # ============================================
+    # 🎟️ التخصيص
+    # ============================================
+
+    def get_allocation(self, request_id: str) -> dict[str, list[str]] | None:
+        """الأكواد المخصصة لطلب معين، إن وجدت."""
+        return self._data["allocations"].get(request_id)
+
+    def allocate(self, request_id: str, counts: dict[str, int]) -> dict[str, list[str]] | None:
+        """
+        تخصيص الأكواد المطلوبة لطلب.
+        تُرجع الأكواد المخصصة لكل نوع، أو None إذا لم يكفِ المخزون (بدون صرف أي كود).
+        """
+        existing = self.get_allocation(request_id)
+        if existing is not None:
+            return existing
+
+        # التحقق من كفاية المخزون لكل الأنواع قبل صرف أي كود
+        for pool, count in counts.items():
+            if count > self.remaining(pool):
+                return None
+
+        allocation = {}
+        for pool, count in counts.items():
+            state = self._data["pools"][pool]
+            split = len(state["available"]) - count
+            codes = state["available"][split:]
+            del state["available"][split:]
+            for code in codes:
+                state["issued"][code] = request_id
+            allocation[pool] = codes
+
+        self._data["allocations"][request_id] = allocation
+        self._save()
+        return allocation
+
+    def pop_low_stock_alerts(self, pools) -> list[str]:
+        """الأنواع (من pools) التي نزل مخزونها تحت الحد ولم يُرسل عنها تنبيه بعد."""
+        alerts = []
+        for pool in pools:
+            if self.remaining(pool) < self.low_stock_threshold and not self._data["low_stock_alerted"][pool]:
+                self._data["low_stock_alerted"][pool] = True
+                alerts.append(pool)
+        if alerts:
+            self._save()
+        return alerts
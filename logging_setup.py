@@ -0,0 +1,148 @@
+# ============================================
+# 📋 نظام التسجيل (Logging) - logging_setup.py
+# تسجيل غير حاجب: الرسائل تُرسل إلى طابور ويكتبها خيط منفصل بصيغة JSON
+# ============================================
+#
+# - خيط حلقة الأحداث يضع السجل في الطابور فقط (بدون تنسيق JSON أو كتابة).
+# - خيط QueueListener يقوم بالتنسيق والكتابة إلى الطرفية و/أو ملف مع التدوير.
+# - الحقول الإضافية المدعومة عبر extra: request_id, user_id, handler, duration.
+# - أخذ عينات لكل logger، وتحديد معدل للرسائل المزعجة عبر extra={"rate_key": ...}.
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+
+# الحقول الإضافية التي تُضاف إلى سجل JSON إذا وجدت
+STRUCTURED_FIELDS = ("request_id", "user_id", "handler", "duration", "suppressed")
+
+
+class JsonFormatter(logging.Formatter):
+    """تنسيق السجل كسطر JSON واحد."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """تسجيل نسبة فقط من رسائل loggers معينة (الأخطاء تُسجل دائماً)."""
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(record.name)
+        return rate is None or random.random() < rate
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    تحديد عدد الرسائل لكل مفتاح rate_key خلال فترة زمنية.
+    عدد الرسائل المحذوفة يُضاف إلى أول رسالة مسموحة بعدها (الحقل suppressed).
+    """
+
+    def __init__(self, limit: int, window: float):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        # rate_key -> [بداية الفترة, عدد الرسائل, عدد المحذوف]
+        self._buckets: dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, "rate_key", None)
+        if key is None:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None or now - bucket[0] >= self.window:
+                suppressed = bucket[2] if bucket else 0
+                self._buckets[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if bucket[1] < self.limit:
+                bucket[1] += 1
+                return True
+            bucket[2] += 1
+            return False
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler لا ينسق السجل في خيط المستدعي.
+    يتم فقط دمج الرسالة مع معاملاتها (تنسيق % البسيط) ليبقى السجل آمناً للنقل.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(
+    level: str = "INFO",
+    log_file: str | None = None,
+    max_bytes: int = 5 * 1024 * 1024,
+    backup_count: int = 3,
+    sampling: dict[str, float] | None = None,
+    rate_limit: tuple[int, float] = (5, 60),
+) -> logging.handlers.QueueListener:
+    """تهيئة نظام التسجيل وتشغيل خيط الكتابة في الخلفية."""
+    formatter = JsonFormatter()
+    handlers: list[logging.Handler] = []
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(formatter)
+    handlers.append(stream_handler)
+
+    if log_file:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+
+    log_queue: queue.Queue = queue.Queue(-1)
+    queue_handler = LazyQueueHandler(log_queue)
+    # الفلاتر تعمل قبل الإضافة إلى الطابور حتى لا تُنقل الرسائل المحذوفة أصلاً
+    queue_handler.addFilter(SamplingFilter(sampling or {}))
+    queue_handler.addFilter(RateLimitFilter(*rate_limit))
+
+    root = logging.getLogger()
+    root.handlers.clear()
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # تفريغ الطابور عند إنهاء البرنامج
+    atexit.register(listener.stop)
+    return listener
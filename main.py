@@ -5,10 +5,12 @@
 # ============================================
 
 import asyncio
-import json
+import html
+import itertools
 import os
 import logging
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 
 from aiogram import Bot, Dispatcher, Router, F
 from aiogram.types import (
@@ -20,12 +22,14 @@ from aiogram.types import (
     InlineKeyboardButton,
     ReplyKeyboardRemove,
     BotCommand,
+    BufferedInputFile,
 )
-from aiogram.filters import Command, StateFilter
+from aiogram.filters import Command, CommandObject, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 from aiogram.client.default import DefaultBotProperties
 
 from config import (
@@ -34,25 +38,64 @@ from config import (
     ALLOWED_USERS,
     ADMIN_ID,
     DATABASE_FILE,
+    DATABASE_FORMAT,
     WELCOME_MESSAGE,
     UNAUTHORIZED_MESSAGE,
+    ARCHIVE_AFTER_DAYS,
+    JOBS_FILE,
+    STALE_REQUEST_HOURS,
+    DAILY_DIGEST_HOUR,
+    COMPACTION_INTERVAL_HOURS,
+    LOG_LEVEL,
+    LOG_FILE,
+    LOG_MAX_BYTES,
+    LOG_BACKUP_COUNT,
+    LOG_SAMPLING,
+    LOG_RATE_LIMIT,
+    DEDUP_CACHE_SIZE,
+    DEDUP_TTL_SECONDS,
+    DEDUP_FILE,
+    DEDUP_SAVE_INTERVAL_SECONDS,
+    PROFILE_DEFAULT_SECONDS,
+    PROFILE_MAX_SECONDS,
+    PROFILE_SLOW_CALLBACK_MS,
+    RECONCILE_BATCH_SIZE,
+    RECONCILE_BATCH_DELAY,
+    STATUS_LOOKUP_LIMIT,
+    STATUS_LOOKUP_WINDOW,
+    CODE_ALLOCATION_ENABLED,
+    CODES_FILE,
+    CODES_LOW_STOCK_THRESHOLD,
 )
+from logging_setup import setup_logging
+from middlewares import HandlerLoggingMiddleware, DeduplicationMiddleware
+from dedup import ExpiringSet
+from archive import TIMESTAMP_FORMAT, archive_requests, get_archived_request, iter_archived_requests
+from scheduler import JobScheduler
+from profiler import is_profiling, profile_process
+from status_lookup import StatusIndex, UserRateLimiter, is_student_number
+from inventory import POOLS, CodeInventory
+from serializers import CorruptDatabaseError, UnsupportedFormatError, ensure_format_available, load_file, save_file
 
 # ============================================
 # 📋 إعداد التسجيل (Logging)
 # ============================================
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+log_listener = setup_logging(
+    level=LOG_LEVEL,
+    log_file=LOG_FILE,
+    max_bytes=LOG_MAX_BYTES,
+    backup_count=LOG_BACKUP_COUNT,
+    sampling=LOG_SAMPLING,
+    rate_limit=LOG_RATE_LIMIT,
 )
 logger = logging.getLogger(__name__)
 
 # ============================================
-# 🗂️ إدارة قاعدة البيانات JSON
+# 🗂️ إدارة قاعدة البيانات (JSON أو صيغة أسرع حسب DATABASE_FORMAT)
 # ============================================
 
 def load_database() -> dict:
-    """تحميل قاعدة البيانات من ملف JSON، وإنشاؤه إذا لم يكن موجوداً."""
+    """تحميل قاعدة البيانات (بأي صيغة مدعومة)، وإنشاؤها إذا لم تكن موجودة."""
     default_data = {
         "statistics": {
             "accepted_students": 0,
@@ -63,30 +106,34 @@ def load_database() -> dict:
     }
     if not os.path.exists(DATABASE_FILE):
         save_database(default_data)
-        logger.info("✅ تم إنشاء ملف قاعدة البيانات database.json")
+        logger.info("✅ تم إنشاء ملف قاعدة البيانات %s", DATABASE_FILE)
         return default_data
     try:
-        with open(DATABASE_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = load_file(DATABASE_FILE)
         # التأكد من وجود المفاتيح الأساسية
         if "statistics" not in data:
             data["statistics"] = default_data["statistics"]
         if "requests" not in data:
             data["requests"] = {}
         return data
-    except (json.JSONDecodeError, Exception) as e:
-        logger.error(f"❌ خطأ في قراءة قاعدة البيانات: {e}")
+    except CorruptDatabaseError as e:
+        # الملف فارغ أو تالف: نقله جانباً (دون حذفه) ثم البدء بقاعدة بيانات جديدة.
+        # أخطاء الصيغة غير المدعومة وأخطاء القراءة لا تُلتقط هنا حتى لا يُستبدل ملف سليم.
+        corrupt_path = f"{DATABASE_FILE}.corrupt-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        os.replace(DATABASE_FILE, corrupt_path)
+        logger.error("❌ قاعدة البيانات تالفة (%s)، تم نقلها إلى %s", e, corrupt_path)
         save_database(default_data)
         return default_data
 
 
 def save_database(data: dict) -> None:
-    """حفظ البيانات في ملف JSON."""
+    """حفظ البيانات بالصيغة المحددة في DATABASE_FORMAT."""
     try:
-        with open(DATABASE_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
+        save_file(DATABASE_FILE, data, DATABASE_FORMAT)
+    except UnsupportedFormatError:
+        raise
     except Exception as e:
-        logger.error(f"❌ خطأ في حفظ قاعدة البيانات: {e}")
+        logger.error("❌ خطأ في حفظ قاعدة البيانات: %s", e)
 
 
 def save_request(request_id: str, request_data: dict) -> None:
@@ -96,11 +143,11 @@ def save_request(request_id: str, request_data: dict) -> None:
     save_database(db)
 
 
-def update_request_status(request_id: str, status: str) -> bool:
-    """تحديث حالة الطلب (accepted / rejected)."""
+def update_request_fields(request_id: str, **fields) -> bool:
+    """تحديث حقول معينة في الطلب (مثل message_id وحالة التسليم)."""
     db = load_database()
     if request_id in db["requests"]:
-        db["requests"][request_id]["status"] = status
+        db["requests"][request_id].update(fields)
         save_database(db)
         return True
     return False
@@ -122,9 +169,31 @@ def get_statistics() -> dict:
 
 
 def get_request(request_id: str) -> dict | None:
-    """الحصول على بيانات طلب معين."""
+    """الحصول على بيانات طلب معين (من قاعدة البيانات أو من الأرشيف)."""
     db = load_database()
-    return db["requests"].get(request_id)
+    request_data = db["requests"].get(request_id)
+    if request_data is None:
+        request_data = get_archived_request(request_id)
+    return request_data
+
+
+def get_pending_requests() -> dict:
+    """الحصول على جميع الطلبات المعلقة."""
+    db = load_database()
+    return {
+        request_id: request_data
+        for request_id, request_data in db["requests"].items()
+        if request_data.get("status") == "pending"
+    }
+
+
+def archive_old_requests() -> int:
+    """أرشفة الطلبات المنتهية القديمة لإبقاء قاعدة البيانات صغيرة."""
+    db = load_database()
+    archived = archive_requests(db, ARCHIVE_AFTER_DAYS)
+    if archived:
+        save_database(db)
+    return archived
 
 
 # ============================================
@@ -154,8 +223,16 @@ bot = Bot(
 )
 storage = MemoryStorage()
 dp = Dispatcher(storage=storage)
+seen_updates = ExpiringSet(DEDUP_CACHE_SIZE, DEDUP_TTL_SECONDS)
+dp.update.outer_middleware(DeduplicationMiddleware(seen_updates))
 router = Router()
+router.message.middleware(HandlerLoggingMiddleware())
+router.callback_query.middleware(HandlerLoggingMiddleware())
 dp.include_router(router)
+scheduler = JobScheduler(JOBS_FILE)
+status_index = StatusIndex()
+lookup_limiter = UserRateLimiter(STATUS_LOOKUP_LIMIT, STATUS_LOOKUP_WINDOW)
+code_inventory = CodeInventory(CODES_FILE, CODES_LOW_STOCK_THRESHOLD)
 
 
 # ============================================
@@ -270,6 +347,158 @@ async def cmd_admin(message: Message):
     await message.answer(stats_message)
 
 
+# ============================================
+# 🔬 معالج أمر /profile
+# ============================================
+
+@router.message(Command("profile"))
+async def cmd_profile(message: Message, command: CommandObject):
+    """تحليل أداء البوت أثناء التشغيل وإرسال التقرير كملف (للأدمن فقط)."""
+    if not is_admin(message.from_user.id):
+        if not is_authorized(message.from_user.id):
+            await message.answer(UNAUTHORIZED_MESSAGE)
+        else:
+            await message.answer("⛔ ليس لديك صلاحية لاستخدام هذا الأمر.")
+        return
+
+    seconds = PROFILE_DEFAULT_SECONDS
+    if command.args:
+        if not command.args.strip().isdigit():
+            await message.answer("⚠️ الاستخدام: <code>/profile [عدد الثواني]</code>")
+            return
+        seconds = min(max(int(command.args.strip()), 1), PROFILE_MAX_SECONDS)
+
+    busy_text = "⏳ يوجد تحليل قيد التشغيل حالياً، الرجاء الانتظار."
+    if is_profiling():
+        await message.answer(busy_text)
+        return
+
+    await message.answer(f"🔬 جاري تحليل الأداء لمدة <b>{seconds}</b> ثانية...")
+    try:
+        report = await profile_process(seconds, PROFILE_SLOW_CALLBACK_MS)
+    except RuntimeError:
+        # أمران /profile متتاليان قد يمران من الفحص السابق قبل بدء التحليل الأول
+        await message.answer(busy_text)
+        return
+
+    filename = f"profile_{datetime.now():%Y%m%d_%H%M%S}.txt"
+    await message.answer_document(
+        BufferedInputFile(report.encode("utf-8"), filename=filename),
+        caption="📄 تقرير تحليل الأداء",
+    )
+
+
+# ============================================
+# 🔄 معالج أمر /refresh
+# ============================================
+
+@router.message(Command("refresh"))
+async def cmd_refresh(message: Message, command: CommandObject):
+    """إعادة عرض رسالة طلب في القناة حسب حالته الحالية (للأدمن فقط)."""
+    if not is_admin(message.from_user.id):
+        if not is_authorized(message.from_user.id):
+            await message.answer(UNAUTHORIZED_MESSAGE)
+        else:
+            await message.answer("⛔ ليس لديك صلاحية لاستخدام هذا الأمر.")
+        return
+
+    if not command.args:
+        await message.answer("⚠️ الاستخدام: <code>/refresh معرف_الطلب</code>")
+        return
+
+    request_id = command.args.strip()
+    request_data = get_request(request_id)
+    if request_data is None:
+        await message.answer("⚠️ لم يتم العثور على هذا الطلب.")
+        return
+
+    # أكواد مصروفة لم تصل لمقدم الطلب: نعيد إرسالها
+    if request_data.get("codes_delivery") == "failed" and request_data.get("allocated_codes"):
+        if await deliver_codes(request_id, request_data, request_data["allocated_codes"]):
+            # التأكد من حفظ حالة التسليم، وإلا سيعيد كل /refresh لاحق إرسال الأكواد
+            if update_request_fields(request_id, codes_delivery="sent"):
+                await message.answer("✅ تم إعادة إرسال الأكواد لمقدم الطلب.")
+            else:
+                await message.answer(
+                    "⚠️ تم إرسال الأكواد لمقدم الطلب، لكن تعذر حفظ حالة التسليم (الطلب مؤرشف).\n"
+                    "لا تستخدم /refresh لهذا الطلب مرة أخرى حتى لا تُرسل الأكواد من جديد."
+                )
+        else:
+            await message.answer("❌ تعذر إرسال الأكواد لمقدم الطلب، راجع السجلات.")
+
+    # طلب لم يصل للقناة أصلاً: نعيد إرساله، وإلا نعدل الرسالة الموجودة
+    if not request_data.get("channel_message_id"):
+        if request_data["status"] != "pending":
+            await message.answer("⚠️ لا توجد رسالة محفوظة في القناة لهذا الطلب.")
+            return
+        done = await _with_retry_after(send_channel_post, request_id, request_data)
+    else:
+        done = await _with_retry_after(edit_channel_post, request_id)
+
+    if done:
+        await message.answer("✅ تم تحديث رسالة الطلب في القناة.")
+    else:
+        await message.answer("❌ تعذر تحديث رسالة الطلب، راجع السجلات.")
+
+
+# ============================================
+# 🎟️ أوامر مخزون الأكواد
+# ============================================
+
+@router.message(Command("import_codes"), F.document)
+async def cmd_import_codes(message: Message, command: CommandObject):
+    """استيراد أكواد من ملف نصي (كود في كل سطر) مرفق مع الأمر (للأدمن فقط)."""
+    if not is_admin(message.from_user.id):
+        if not is_authorized(message.from_user.id):
+            await message.answer(UNAUTHORIZED_MESSAGE)
+        else:
+            await message.answer("⛔ ليس لديك صلاحية لاستخدام هذا الأمر.")
+        return
+
+    pool = (command.args or "").strip()
+    if pool not in POOLS:
+        await message.answer(
+            "⚠️ الاستخدام: أرسل ملف الأكواد مع التعليق\n"
+            "<code>/import_codes regular</code> أو <code>/import_codes english</code>"
+        )
+        return
+
+    file = await bot.download(message.document)
+    try:
+        lines = file.read().decode("utf-8-sig").splitlines()
+    except UnicodeDecodeError:
+        await message.answer("⚠️ يجب أن يكون الملف نصياً بترميز UTF-8.")
+        return
+
+    added, skipped = code_inventory.import_codes(pool, lines)
+    logger.info("🎟️ تم استيراد %s كود (%s) وتجاهل %s مكرر", added, pool, skipped)
+    await message.answer(
+        f"✅ تم استيراد <b>{added}</b> كود إلى {POOL_LABELS[pool]}\n"
+        f"🔁 تم تجاهل <b>{skipped}</b> كود مكرر\n"
+        f"📦 المتوفر الآن: <b>{code_inventory.remaining(pool)}</b>"
+    )
+
+
+@router.message(Command("stock"))
+async def cmd_stock(message: Message):
+    """عرض مخزون الأكواد (للأدمن فقط)."""
+    if not is_admin(message.from_user.id):
+        if not is_authorized(message.from_user.id):
+            await message.answer(UNAUTHORIZED_MESSAGE)
+        else:
+            await message.answer("⛔ ليس لديك صلاحية لاستخدام هذا الأمر.")
+        return
+
+    lines = ["━━━━━━━━━━━━━━━━━━━━━━", "🎟️ <b>مخزون الأكواد</b>", "━━━━━━━━━━━━━━━━━━━━━━\n"]
+    for pool in POOLS:
+        lines.append(
+            f"{POOL_LABELS[pool]}: متوفر <b>{code_inventory.remaining(pool)}</b> | "
+            f"مصروف <b>{code_inventory.issued(pool)}</b>\n"
+        )
+    lines.append("━━━━━━━━━━━━━━━━━━━━━━")
+    await message.answer("\n".join(lines))
+
+
 # ============================================
 # ❌ معالج زر الإلغاء (في أي حالة FSM)
 # ============================================
@@ -541,32 +770,7 @@ async def process_notes(message: Message, state: FSMContext):
     # التاريخ والوقت
     now = datetime.now().strftime("%Y-%m-%d | %H:%M:%S")
 
-    # تحديد نص أكواد الإنجليزي
-    english_codes_text = "لا يوجد"
     english_codes_count = data.get("english_codes_count", 0)
-    if data.get("has_english_codes") and english_codes_count > 0:
-        english_codes_text = str(english_codes_count)
-
-    # بناء رسالة القناة
-    channel_message = (
-        "━━━━━━━━━━━━━━━━━━━━━━\n"
-        "📨 <b>طلب جديد</b>\n"
-        "━━━━━━━━━━━━━━━━━━━━━━\n\n"
-        f"👤 <b>اسم الطالب:</b> {data['student_name']}\n\n"
-        f"🔢 <b>رقم الطالب:</b> {data['student_number']}\n\n"
-        f"📱 <b>معرف التلغرام:</b> {data['telegram_username']}\n\n"
-        f"📟 <b>معرف الجهاز:</b> <code>{data['device_id']}</code>\n\n"
-        f"📚 <b>المواد المطلوبة:</b> {data['subjects']}\n\n"
-        f"🔑 <b>عدد الأكواد:</b> {data['codes_count']}\n\n"
-        f"🇬🇧 <b>أكواد الإنجليزي:</b> {english_codes_text}\n\n"
-        "━━━━━━━━━━━━━━━━━━━━━━\n"
-        f"👨‍💼 <b>مقدم الطلب:</b> {submitter_name}\n"
-        f"🆔 <b>آيدي مقدم الطلب:</b> <code>{submitter_id}</code>\n"
-        f"📎 <b>يوزر مقدم الطلب:</b> {submitter_username}\n\n"
-        f"📋 <b>ملاحظات:</b> {data['notes']}\n\n"
-        f"🕐 <b>التاريخ والوقت:</b> {now}\n"
-        "━━━━━━━━━━━━━━━━━━━━━━"
-    )
 
     # حفظ الطلب في قاعدة البيانات
     request_data = {
@@ -584,29 +788,32 @@ async def process_notes(message: Message, state: FSMContext):
         "submitter_username": submitter_username,
         "timestamp": now,
         "status": "pending",  # pending / accepted / rejected
+        "channel_message_id": None,
+        "delivery": "pending",  # pending / sent / failed
+        "rendered_status": None,  # الحالة المعروضة حالياً في رسالة القناة
     }
     save_request(request_id, request_data)
+    status_index.upsert(request_id, request_data)
+    schedule_stale_reminder(request_id, time.time())
 
-    try:
-        # إرسال الرسالة للقناة مع أزرار الموافقة/الرفض
-        await bot.send_message(
-            chat_id=CHANNEL_ID,
-            text=channel_message,
-            reply_markup=get_approval_keyboard(request_id),
-        )
-
+    # إرسال الرسالة للقناة مع أزرار الموافقة/الرفض
+    # (عند تجاوز حد الإرسال ننتظر ونعيد المحاولة بدلاً من ترك الطلب دون رد لمقدمه)
+    if await _with_retry_after(send_channel_post, request_id, request_data):
         await message.answer(
             "✅ <b>تم إرسال الطلب بنجاح!</b>\n\n"
             "📨 تم إرسال الطلب إلى القناة للمراجعة.",
             reply_markup=get_main_keyboard(),
         )
-        logger.info(f"✅ تم إرسال طلب جديد: {request_id} من المستخدم {submitter_id}")
-
-    except Exception as e:
-        logger.error(f"❌ خطأ في إرسال الطلب للقناة: {e}")
+        logger.info(
+            "✅ تم إرسال طلب جديد: %s من المستخدم %s",
+            request_id,
+            submitter_id,
+            extra={"request_id": request_id, "user_id": submitter_id},
+        )
+    else:
         await message.answer(
             "❌ حدث خطأ أثناء إرسال الطلب.\n"
-            "الرجاء المحاولة لاحقاً.",
+            "سيتم إعادة إرساله للقناة تلقائياً عند إعادة تشغيل البوت.",
             reply_markup=get_main_keyboard(),
         )
 
@@ -615,7 +822,7 @@ async def process_notes(message: Message, state: FSMContext):
 # 🔧 دالة إعادة بناء نص رسالة القناة
 # ============================================
 
-def build_channel_text(request_data: dict) -> str:
+def build_channel_text(request_data: dict, title: str = "طلب") -> str:
     """إعادة بناء نص الرسالة الأصلية للقناة."""
     english_codes_text = "لا يوجد"
     if request_data.get("has_english_codes") and request_data.get("english_codes_count", 0) > 0:
@@ -623,7 +830,7 @@ def build_channel_text(request_data: dict) -> str:
 
     return (
         "━━━━━━━━━━━━━━━━━━━━━━\n"
-        "📨 <b>طلب</b>\n"
+        f"📨 <b>{title}</b>\n"
         "━━━━━━━━━━━━━━━━━━━━━━\n\n"
         f"👤 <b>اسم الطالب:</b> {request_data['student_name']}\n\n"
         f"🔢 <b>رقم الطالب:</b> {request_data['student_number']}\n\n"
@@ -642,15 +849,219 @@ def build_channel_text(request_data: dict) -> str:
     )
 
 
+def render_channel_post(request_id: str, request_data: dict) -> tuple[str, InlineKeyboardMarkup | None]:
+    """نص وأزرار رسالة القناة حسب حالة الطلب الحالية."""
+    status = request_data["status"]
+    if status == "pending":
+        return build_channel_text(request_data, "طلب جديد"), get_approval_keyboard(request_id)
+
+    if status == "accepted":
+        footer = "✅ <b>تمت الموافقة</b>"
+    else:
+        footer = "❌ <b>تم الرفض</b>"
+    text = (
+        build_channel_text(request_data)
+        + f"\n\n{footer}\n"
+        f"👨‍💼 بواسطة: {request_data.get('decided_by', 'مشرف')}\n"
+        f"🕐 في: {request_data.get('decided_at', '-')}"
+    )
+    return text, None
+
+
+# ============================================
+# 📢 إرسال وتعديل رسائل القناة
+# ============================================
+
+async def send_channel_post(request_id: str, request_data: dict) -> bool:
+    """إرسال رسالة الطلب للقناة وحفظ message_id وحالة التسليم."""
+    text, markup = render_channel_post(request_id, request_data)
+    try:
+        sent = await bot.send_message(chat_id=CHANNEL_ID, text=text, reply_markup=markup)
+    except TelegramRetryAfter:
+        # يُعالج في مستوى أعلى (مثل التسوية عند التشغيل)
+        raise
+    except Exception as e:
+        logger.error("❌ خطأ في إرسال الطلب للقناة: %s", e, extra={"request_id": request_id})
+        update_request_fields(request_id, delivery="failed")
+        return False
+
+    update_request_fields(
+        request_id,
+        channel_message_id=sent.message_id,
+        delivery="sent",
+        rendered_status=request_data["status"],
+    )
+    return True
+
+
+async def edit_channel_post(request_id: str) -> bool:
+    """
+    إعادة عرض رسالة الطلب في القناة حسب حالته الحالية.
+    يمكن استدعاؤها من أي مكان (زر، أمر أدمن، تسوية) لأن message_id محفوظ.
+    """
+    request_data = get_request(request_id)
+    if request_data is None or not request_data.get("channel_message_id"):
+        return False
+
+    text, markup = render_channel_post(request_id, request_data)
+    try:
+        await bot.edit_message_text(
+            text=text,
+            chat_id=CHANNEL_ID,
+            message_id=request_data["channel_message_id"],
+            reply_markup=markup,
+        )
+    except TelegramRetryAfter:
+        raise
+    except TelegramBadRequest as e:
+        # الرسالة معروضة بالفعل بنفس المحتوى
+        if "message is not modified" not in str(e):
+            logger.error("خطأ في تحديث رسالة القناة: %s", e, extra={"request_id": request_id})
+            return False
+    except Exception as e:
+        logger.error("خطأ في تحديث رسالة القناة: %s", e, extra={"request_id": request_id})
+        return False
+
+    update_request_fields(request_id, rendered_status=request_data["status"])
+    return True
+
+
+async def _with_retry_after(func, *args) -> bool:
+    """تنفيذ طلب لتلغرام مع انتظار المدة المطلوبة عند تجاوز حد الإرسال."""
+    while True:
+        try:
+            return await func(*args)
+        except TelegramRetryAfter as e:
+            logger.warning("⏳ تجاوز حد الإرسال، الانتظار %s ثانية", e.retry_after)
+            await asyncio.sleep(e.retry_after)
+
+
+async def reconcile_channel_posts() -> None:
+    """تشغيل تسوية رسائل القناة في الخلفية مع تسجيل أي خطأ بدلاً من ضياعه داخل المهمة."""
+    try:
+        await _reconcile_channel_posts()
+    except Exception:
+        logger.exception("❌ خطأ أثناء تسوية رسائل القناة")
+
+
+async def _reconcile_channel_posts() -> None:
+    """
+    تسوية رسائل القناة عند التشغيل:
+    - إعادة إرسال الطلبات المعلقة التي فشل إرسالها أو لم تُرسل.
+    - إعادة عرض الرسائل التي لا تطابق حالة الطلب الحالية.
+    - إعادة إرسال الأكواد المخصصة التي فشل تسليمها لمقدم الطلب.
+    تتم العملية على دفعات مع فاصل زمني لتجنب حدود تلغرام.
+    """
+    db = load_database()
+    to_send = []
+    to_edit = []
+    to_deliver = []
+    for request_id, request_data in db["requests"].items():
+        if request_data.get("codes_delivery") == "failed" and request_data.get("allocated_codes"):
+            to_deliver.append((request_id, request_data))
+        # الطلبات القديمة (قبل حفظ حالة التسليم) لا يُعرف إن أرسلت، فلا نعيد إرسالها
+        if request_data.get("delivery") in ("pending", "failed"):
+            if request_data["status"] == "pending":
+                to_send.append((request_id, request_data))
+        elif request_data.get("channel_message_id") and request_data.get("rendered_status") != request_data["status"]:
+            to_edit.append(request_id)
+
+    if not to_send and not to_edit and not to_deliver:
+        return
+    logger.info(
+        "🔄 تسوية رسائل القناة: %s للإرسال، %s للتحديث، %s أكواد لإعادة التسليم",
+        len(to_send),
+        len(to_edit),
+        len(to_deliver),
+    )
+
+    jobs = [(send_channel_post, request_id, request_data) for request_id, request_data in to_send]
+    jobs += [(edit_channel_post, request_id) for request_id in to_edit]
+    jobs += [
+        (deliver_codes, request_id, request_data, request_data["allocated_codes"])
+        for request_id, request_data in to_deliver
+    ]
+    for start in range(0, len(jobs), RECONCILE_BATCH_SIZE):
+        if start:
+            await asyncio.sleep(RECONCILE_BATCH_DELAY)
+        for func, *args in jobs[start:start + RECONCILE_BATCH_SIZE]:
+            await _with_retry_after(func, *args)
+
+    logger.info("✅ تمت تسوية رسائل القناة")
+
+
+# ============================================
+# 🎟️ تسليم الأكواد وتنبيهات المخزون
+# ============================================
+
+POOL_LABELS = {"regular": "🔑 الأكواد العادية", "english": "🇬🇧 أكواد الإنجليزي"}
+
+
+async def deliver_codes(request_id: str, request_data: dict, allocation: dict) -> bool:
+    """إرسال الأكواد المخصصة لمقدم الطلب."""
+    lines = [
+        "━━━━━━━━━━━━━━━━━━━━━━",
+        "✅ <b>تمت الموافقة على الطلب</b>",
+        "━━━━━━━━━━━━━━━━━━━━━━\n",
+        f"👤 <b>اسم الطالب:</b> {request_data['student_name']}",
+        f"🔢 <b>رقم الطالب:</b> {request_data['student_number']}\n",
+    ]
+    for pool in POOLS:
+        codes = allocation.get(pool)
+        if codes:
+            lines.append(f"<b>{POOL_LABELS[pool]}:</b>")
+            lines.extend(f"<code>{html.escape(code)}</code>" for code in codes)
+            lines.append("")
+
+    try:
+        await bot.send_message(chat_id=request_data["submitter_id"], text="\n".join(lines))
+    except Exception as e:
+        logger.error("❌ خطأ في إرسال الأكواد لمقدم الطلب: %s", e, extra={"request_id": request_id})
+        update_request_fields(request_id, codes_delivery="failed")
+        # الأكواد مصروفة من المخزون، لذلك ننبه الأدمن عند أول فشل فقط حتى يعيد إرسالها
+        if request_data.get("codes_delivery") != "failed":
+            try:
+                await bot.send_message(
+                    chat_id=ADMIN_ID,
+                    text=(
+                        "⚠️ <b>تعذر إرسال الأكواد لمقدم الطلب</b>\n\n"
+                        f"🆔 الطلب: <code>{request_id}</code>\n"
+                        f"🔁 لإعادة الإرسال: <code>/refresh {request_id}</code>"
+                    ),
+                )
+            except Exception as alert_error:
+                logger.error("❌ خطأ في إرسال تنبيه فشل تسليم الأكواد: %s", alert_error)
+        return False
+
+    update_request_fields(request_id, codes_delivery="sent")
+    return True
+
+
+async def send_low_stock_alerts(pools) -> None:
+    """تنبيه الأدمن عند انخفاض مخزون نوع من الأكواد تحت الحد (مرة واحدة لكل انخفاض)."""
+    for pool in code_inventory.pop_low_stock_alerts(pools):
+        try:
+            await bot.send_message(
+                chat_id=ADMIN_ID,
+                text=(
+                    "⚠️ <b>تنبيه: مخزون الأكواد منخفض</b>\n\n"
+                    f"{POOL_LABELS[pool]}: <b>{code_inventory.remaining(pool)}</b> كود متبقي"
+                ),
+            )
+        except Exception as e:
+            logger.error("❌ خطأ في إرسال تنبيه المخزون: %s", e)
+
+
 # ============================================
 # ✅ معالج زر الموافقة (Inline Callback)
 # ============================================
 
-@router.callback_query(F.data.startswith("approve_"))
+# أزرار القناة يضغطها مشرفو القناة وليس بالضرورة أن يكونوا ضمن ALLOWED_USERS
+@router.callback_query(F.data.startswith("approve_"), flags={"public": True})
 async def handle_approval(callback: CallbackQuery):
     """
     معالجة الضغط على زر الموافقة.
-    - يتم قبول الطلب مباشرة بدون طلب أكواد.
+    - يتم تخصيص الأكواد من المخزون وإرسالها لمقدم الطلب (إذا كان التخصيص مفعلاً).
     - يتم إحصاء عدد الأكواد العادية والإنجليزي تلقائياً من بيانات الطلب.
     - يتم تحديث رسالة القناة.
     """
@@ -672,34 +1083,60 @@ async def handle_approval(callback: CallbackQuery):
         )
         return
 
-    # تحديث حالة الطلب إلى مقبول
-    update_request_status(request_id, "accepted")
-
-    # تحديث الإحصائيات (إحصاء الأكواد من بيانات الطلب)
     codes_count = request_data["codes_count"]
     english_codes_count = request_data.get("english_codes_count", 0)
-    update_statistics(codes_count, english_codes_count)
 
-    # تحديث رسالة القناة
+    # تخصيص الأكواد من المخزون قبل تغيير الحالة.
+    # من التحقق من الحالة حتى حفظها لا يوجد أي await، لذلك لا تتداخل موافقتان على نفس الطلب.
+    allocation = None
+    if CODE_ALLOCATION_ENABLED:
+        allocation = code_inventory.allocate(
+            request_id, {"regular": codes_count, "english": english_codes_count}
+        )
+        if allocation is None:
+            await callback.answer(
+                "⚠️ لا يوجد مخزون كافٍ من الأكواد لهذا الطلب.\n"
+                f"🔑 المتوفر: {code_inventory.remaining('regular')} عادي | "
+                f"🇬🇧 {code_inventory.remaining('english')} إنجليزي",
+                show_alert=True,
+            )
+            return
+
+    # تحديث حالة الطلب إلى مقبول
     approver_name = callback.from_user.full_name or "مشرف"
     now = datetime.now().strftime("%Y-%m-%d | %H:%M:%S")
+    update_request_fields(
+        request_id,
+        status="accepted",
+        decided_by=approver_name,
+        decided_at=now,
+        # الطلبات القديمة لم يُحفظ لها message_id، نأخذه من رسالة الزر
+        channel_message_id=request_data.get("channel_message_id") or callback.message.message_id,
+        allocated_codes=allocation,
+    )
+    scheduler.cancel(f"remind_{request_id}")
+    status_index.upsert(request_id, dict(request_data, status="accepted"))
+
+    # تحديث الإحصائيات (إحصاء الأكواد من بيانات الطلب)
+    update_statistics(codes_count, english_codes_count)
 
+    # تحديث رسالة القناة (إن فشل تُعاد المحاولة في التسوية عند التشغيل)
     try:
-        await callback.message.edit_text(
-            text=(
-                build_channel_text(request_data)
-                + f"\n\n✅ <b>تمت الموافقة</b>\n"
-                f"👨‍💼 بواسطة: {approver_name}\n"
-                f"🕐 في: {now}"
-            ),
-            reply_markup=None,
-        )
-    except Exception as e:
-        logger.error(f"خطأ في تحديث رسالة القناة: {e}")
+        await edit_channel_post(request_id)
+    except TelegramRetryAfter as e:
+        logger.warning("⏳ تجاوز حد الإرسال عند تحديث رسالة الطلب %s: %s", request_id, e)
+
+    if allocation is not None:
+        await deliver_codes(request_id, request_data, allocation)
+        await send_low_stock_alerts(pool for pool, codes in allocation.items() if codes)
 
     logger.info(
-        f"✅ تم قبول الطلب {request_id} بواسطة {approver_name} | "
-        f"أكواد عادية: {codes_count} | أكواد إنجليزي: {english_codes_count}"
+        "✅ تم قبول الطلب %s بواسطة %s | أكواد عادية: %s | أكواد إنجليزي: %s",
+        request_id,
+        approver_name,
+        codes_count,
+        english_codes_count,
+        extra={"request_id": request_id, "user_id": callback.from_user.id},
     )
 
     await callback.answer(
@@ -713,7 +1150,8 @@ async def handle_approval(callback: CallbackQuery):
 # ❌ معالج زر الرفض (Inline Callback)
 # ============================================
 
-@router.callback_query(F.data.startswith("reject_"))
+# أزرار القناة يضغطها مشرفو القناة وليس بالضرورة أن يكونوا ضمن ALLOWED_USERS
+@router.callback_query(F.data.startswith("reject_"), flags={"public": True})
 async def handle_rejection(callback: CallbackQuery):
     """
     معالجة الضغط على زر الرفض.
@@ -740,30 +1178,55 @@ async def handle_rejection(callback: CallbackQuery):
         return
 
     # تحديث حالة الطلب إلى مرفوض
-    update_request_status(request_id, "rejected")
-
-    # تحديث رسالة القناة
     rejecter_name = callback.from_user.full_name or "مشرف"
     now = datetime.now().strftime("%Y-%m-%d | %H:%M:%S")
+    update_request_fields(
+        request_id,
+        status="rejected",
+        decided_by=rejecter_name,
+        decided_at=now,
+        # الطلبات القديمة لم يُحفظ لها message_id، نأخذه من رسالة الزر
+        channel_message_id=request_data.get("channel_message_id") or callback.message.message_id,
+    )
+    scheduler.cancel(f"remind_{request_id}")
+    status_index.upsert(request_id, dict(request_data, status="rejected"))
 
+    # تحديث رسالة القناة (إن فشل تُعاد المحاولة في التسوية عند التشغيل)
     try:
-        await callback.message.edit_text(
-            text=(
-                build_channel_text(request_data)
-                + f"\n\n❌ <b>تم الرفض</b>\n"
-                f"👨‍💼 بواسطة: {rejecter_name}\n"
-                f"🕐 في: {now}"
-            ),
-            reply_markup=None,
-        )
-    except Exception as e:
-        logger.error(f"خطأ في تحديث رسالة القناة: {e}")
+        await edit_channel_post(request_id)
+    except TelegramRetryAfter as e:
+        logger.warning("⏳ تجاوز حد الإرسال عند تحديث رسالة الطلب %s: %s", request_id, e)
 
-    logger.info(f"❌ تم رفض الطلب {request_id} بواسطة {rejecter_name}")
+    logger.info(
+        "❌ تم رفض الطلب %s بواسطة %s",
+        request_id,
+        rejecter_name,
+        extra={"request_id": request_id, "user_id": callback.from_user.id},
+    )
 
     await callback.answer("❌ تم رفض الطلب.", show_alert=True)
 
 
+# ============================================
+# 🔎 استعلام الطالب عن حالة طلبه (متاح للجميع)
+# ============================================
+
+@router.message(StateFilter(None), F.text.func(is_student_number), flags={"public": True})
+async def handle_status_lookup(message: Message):
+    """
+    إرسال رقم الطالب يعيد حالة طلباته.
+    - يُخدم من فهرس في الذاكرة بدون قراءة قاعدة البيانات.
+    - لكل مستخدم حد أقصى من الاستعلامات، وبعد تجاوزه يتم التنبيه مرة واحدة ثم التجاهل.
+    """
+    hits = lookup_limiter.hit(message.from_user.id)
+    if hits > STATUS_LOOKUP_LIMIT:
+        if hits == STATUS_LOOKUP_LIMIT + 1:
+            await message.answer("⏳ لقد تجاوزت عدد الاستعلامات المسموح، الرجاء المحاولة بعد قليل.")
+        return
+
+    await message.answer(status_index.reply_for(message.text))
+
+
 # ============================================
 # 🚫 معالج الرسائل من غير المصرح لهم
 # ============================================
@@ -791,19 +1254,141 @@ async def handle_all_messages(message: Message):
     )
 
 
+# ============================================
+# ⏰ المهام المجدولة
+# ============================================
+
+def schedule_stale_reminder(request_id: str, created_at: float) -> None:
+    """جدولة تذكير للطلب إذا بقي معلقاً أكثر من STALE_REQUEST_HOURS."""
+    scheduler.schedule(
+        f"remind_{request_id}",
+        "stale_reminder",
+        created_at + STALE_REQUEST_HOURS * 3600,
+        {"request_id": request_id},
+    )
+
+
+def next_daily_run(hour: int) -> float:
+    """موعد التشغيل القادم في الساعة المحددة (اليوم أو غداً)."""
+    now = datetime.now()
+    run_at = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if run_at <= now:
+        run_at += timedelta(days=1)
+    return run_at.timestamp()
+
+
+async def job_stale_reminder(job_id: str, payload: dict) -> float | None:
+    """إرسال تذكير في القناة بطلب ما زال معلقاً، وتكراره حتى تتم معالجته."""
+    request_id = payload["request_id"]
+    request_data = get_request(request_id)
+    if request_data is None or request_data["status"] != "pending":
+        return None
+
+    await bot.send_message(
+        chat_id=CHANNEL_ID,
+        text=(
+            "⏰ <b>تذكير: طلب بانتظار المراجعة</b>\n\n"
+            f"👤 <b>اسم الطالب:</b> {request_data['student_name']}\n"
+            f"🔢 <b>رقم الطالب:</b> {request_data['student_number']}\n"
+            f"🕐 <b>تاريخ الطلب:</b> {request_data['timestamp']}\n\n"
+            f"⚠️ الطلب معلق منذ أكثر من {STALE_REQUEST_HOURS} ساعة."
+        ),
+    )
+    logger.info("⏰ تم إرسال تذكير بالطلب المعلق %s", request_id, extra={"request_id": request_id})
+    return time.time() + STALE_REQUEST_HOURS * 3600
+
+
+async def job_daily_digest(job_id: str, payload: dict) -> float | None:
+    """إرسال ملخص الإحصائيات اليومي للأدمن."""
+    stats = get_statistics()
+    pending_count = len(get_pending_requests())
+    await bot.send_message(
+        chat_id=ADMIN_ID,
+        text=(
+            "━━━━━━━━━━━━━━━━━━━━━━\n"
+            "📊 <b>الملخص اليومي</b>\n"
+            "━━━━━━━━━━━━━━━━━━━━━━\n\n"
+            f"👨‍🎓 عدد الطلاب المقبولين: <b>{stats['accepted_students']}</b>\n\n"
+            f"🔑 مجموع الأكواد العادية: <b>{stats['total_codes']}</b>\n\n"
+            f"🇬🇧 مجموع أكواد الإنجليزي: <b>{stats['total_english_codes']}</b>\n\n"
+            f"⏳ الطلبات المعلقة: <b>{pending_count}</b>\n\n"
+            "━━━━━━━━━━━━━━━━━━━━━━"
+        ),
+    )
+    return next_daily_run(DAILY_DIGEST_HOUR)
+
+
+async def job_compaction(job_id: str, payload: dict) -> float | None:
+    """ضغط قاعدة البيانات دورياً بأرشفة الطلبات المنتهية القديمة."""
+    archive_old_requests()
+    return time.time() + COMPACTION_INTERVAL_HOURS * 3600
+
+
+async def job_dedup_save(job_id: str, payload: dict) -> float | None:
+    """حفظ معرفات التحديثات المعالجة دورياً حتى لا تضيع عند توقف البوت المفاجئ."""
+    if not DEDUP_FILE:
+        return None
+    seen_updates.save(DEDUP_FILE)
+    return time.time() + DEDUP_SAVE_INTERVAL_SECONDS
+
+
+def setup_scheduler() -> None:
+    """تحميل المهام المحفوظة وتسجيل المهام الدورية (بدون تكرار)."""
+    scheduler.load()
+    scheduler.register("stale_reminder", job_stale_reminder)
+    scheduler.register("daily_digest", job_daily_digest)
+    scheduler.register("compaction", job_compaction)
+    scheduler.register("dedup_save", job_dedup_save)
+
+    # الطلبات المعلقة التي ليس لها تذكير (مثلاً من قبل إضافة المجدول)
+    for request_id, request_data in get_pending_requests().items():
+        if scheduler.has_job(f"remind_{request_id}"):
+            continue
+        try:
+            created_at = datetime.strptime(request_data["timestamp"], TIMESTAMP_FORMAT).timestamp()
+        except (KeyError, ValueError):
+            created_at = time.time()
+        schedule_stale_reminder(request_id, created_at)
+
+    scheduler.schedule("daily_digest", "daily_digest", next_daily_run(DAILY_DIGEST_HOUR))
+    scheduler.schedule(
+        "compaction",
+        "compaction",
+        time.time() + COMPACTION_INTERVAL_HOURS * 3600,
+    )
+    if DEDUP_FILE:
+        scheduler.schedule("dedup_save", "dedup_save", time.time() + DEDUP_SAVE_INTERVAL_SECONDS)
+
+
 # ============================================
 # 🚀 تشغيل البوت
 # ============================================
 
 async def main():
     """الدالة الرئيسية لتشغيل البوت."""
-    # تهيئة قاعدة البيانات
+    # التوقف فوراً إذا كانت صيغة الحفظ غير قابلة للاستخدام (مثلاً msgpack غير مثبتة)
+    ensure_format_available(DATABASE_FORMAT)
+
+    # تهيئة قاعدة البيانات وأرشفة الطلبات المنتهية القديمة
     load_database()
+    archive_old_requests()
+
+    # تحميل مخزون الأكواد
+    code_inventory.load()
+
+    # بناء فهرس حالات الطلبات لاستعلامات الطلاب
+    status_index.build(
+        itertools.chain(load_database()["requests"].items(), iter_archived_requests())
+    )
+
+    # تحميل معرفات التحديثات التي تمت معالجتها قبل إعادة التشغيل
+    if DEDUP_FILE:
+        seen_updates.load(DEDUP_FILE)
 
     logger.info("🚀 جاري تشغيل البوت...")
-    logger.info(f"👥 المستخدمون المصرح لهم: {ALLOWED_USERS}")
-    logger.info(f"👑 الأدمن: {ADMIN_ID}")
-    logger.info(f"📢 القناة: {CHANNEL_ID}")
+    logger.info("👥 المستخدمون المصرح لهم: %s", ALLOWED_USERS)
+    logger.info("👑 الأدمن: %s", ADMIN_ID)
+    logger.info("📢 القناة: %s", CHANNEL_ID)
 
     # ============================================
     # 📋 تسجيل قائمة الأوامر (Bot Menu Commands)
@@ -811,13 +1396,30 @@ async def main():
     commands = [
         BotCommand(command="start", description="🏠 بدء البوت والقائمة الرئيسية"),
         BotCommand(command="admin", description="📊 عرض الإحصائيات (للأدمن فقط)"),
+        BotCommand(command="profile", description="🔬 تحليل أداء البوت (للأدمن فقط)"),
+        BotCommand(command="refresh", description="🔄 تحديث رسالة طلب في القناة (للأدمن فقط)"),
+        BotCommand(command="stock", description="🎟️ عرض مخزون الأكواد (للأدمن فقط)"),
     ]
     await bot.set_my_commands(commands)
     logger.info("✅ تم تسجيل قائمة الأوامر بنجاح")
 
+    # تشغيل المجدول في الخلفية
+    setup_scheduler()
+    scheduler_task = asyncio.create_task(scheduler.run())
+
+    # تسوية رسائل القناة في الخلفية حتى لا يتأخر استقبال التحديثات
+    reconcile_task = asyncio.create_task(reconcile_channel_posts())
+
     # حذف webhook إن وجد وبدء التشغيل
     await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        reconcile_task.cancel()
+        scheduler.stop()
+        await scheduler_task
+        if DEDUP_FILE:
+            seen_updates.save(DEDUP_FILE)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,100 @@
+# ============================================
+# 🧩 الوسائط (Middlewares) - middlewares.py
+# ============================================
+
+import logging
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, TelegramObject, Update
+
+from config import ALLOWED_USERS
+from dedup import ExpiringSet
+
+logger = logging.getLogger(__name__)
+
+
+class HandlerLoggingMiddleware(BaseMiddleware):
+    """
+    تسجيل كل معالج بسجل منظم: اسم المعالج، المستخدم، الطلب، ومدة التنفيذ.
+    محاولات غير المصرح لهم تُسجل مع rate_key لتحديد معدلها.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        handler_name = data["handler"].callback.__name__
+        user = data.get("event_from_user")
+        user_id = user.id if user else None
+
+        request_id = None
+        if isinstance(event, CallbackQuery) and event.data and "_" in event.data:
+            request_id = event.data.split("_", 1)[1]
+
+        # المعالجات العامة (flags={"public": True}) متاحة للجميع ولا تُعد محاولة غير مصرح بها
+        if user_id not in ALLOWED_USERS and not get_flag(data, "public"):
+            logger.warning(
+                "🚫 محاولة وصول من مستخدم غير مصرح له",
+                extra={"user_id": user_id, "handler": handler_name, "rate_key": "unauthorized"},
+            )
+
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            logger.info(
+                "تم تنفيذ المعالج %s",
+                handler_name,
+                extra={
+                    "handler": handler_name,
+                    "user_id": user_id,
+                    "request_id": request_id,
+                    "duration": round(time.perf_counter() - started, 4),
+                },
+            )
+
+
+class DeduplicationMiddleware(BaseMiddleware):
+    """
+    تجاهل التحديثات المكررة (نفس update_id أو نفس callback query ID)
+    التي قد يعيد تلغرام إرسالها بعد إعادة المحاولة أو إعادة التشغيل.
+    يُسجل كـ outer middleware على dp.update حتى لا يصل التكرار لأي معالج.
+    إذا فشلت المعالجة تُحذف المفاتيح حتى لا تُعامل إعادة المحاولة كتكرار.
+    """
+
+    def __init__(self, seen: ExpiringSet):
+        self.seen = seen
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, Update):
+            return await handler(event, data)
+
+        keys = [f"u:{event.update_id}"]
+        if event.callback_query is not None:
+            keys.append(f"c:{event.callback_query.id}")
+        # يجب إضافة كل المفاتيح حتى لو كان أحدها مكرراً
+        added = [key for key in keys if not self.seen.check_and_add(key)]
+        if len(added) < len(keys):
+            logger.info(
+                "🔁 تم تجاهل تحديث مكرر %s",
+                event.update_id,
+                extra={"rate_key": "duplicate_update"},
+            )
+            return None
+
+        try:
+            return await handler(event, data)
+        except Exception:
+            for key in added:
+                self.seen.discard(key)
+            raise
@@ -0,0 +1,118 @@
+# ============================================
+# 🔬 تحليل أداء البوت أثناء التشغيل - profiler.py
+# ============================================
+#
+# لا يتم تثبيت أي أداة قياس إلا أثناء جلسة التحليل نفسها،
+# لذلك لا توجد أي تكلفة إضافية عندما يكون التحليل متوقفاً.
+
+import asyncio
+import cProfile
+import io
+import logging
+import pstats
+import tracemalloc
+from datetime import datetime
+
+# عدد الأسطر المعروضة في كل قسم من التقرير
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 15
+
+_active = False
+
+
+class _RecordCollector(logging.Handler):
+    """جمع تحذيرات asyncio عن الـ callbacks البطيئة أثناء التحليل."""
+
+    def __init__(self):
+        super().__init__(level=logging.WARNING)
+        self.messages: list[str] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.messages.append(record.getMessage())
+
+
+def is_profiling() -> bool:
+    """هل توجد جلسة تحليل قيد التشغيل؟"""
+    return _active
+
+
+async def profile_process(seconds: float, slow_callback_ms: float) -> str:
+    """
+    تحليل العملية الحالية لمدة seconds ثانية وإرجاع تقرير نصي يتضمن:
+    - أكثر الدوال استهلاكاً للمعالج (cProfile)
+    - عدد مهام asyncio خلال الفترة
+    - الـ callbacks التي استغرقت أكثر من slow_callback_ms
+    - الفرق في تخصيص الذاكرة (tracemalloc)
+    """
+    global _active
+    if _active:
+        raise RuntimeError("profiling already in progress")
+    _active = True
+
+    loop = asyncio.get_running_loop()
+    previous_debug = loop.get_debug()
+    previous_slow_duration = loop.slow_callback_duration
+    asyncio_logger = logging.getLogger("asyncio")
+    collector = _RecordCollector()
+
+    started_tracemalloc = not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start()
+    snapshot_before = tracemalloc.take_snapshot()
+
+    # وضع debug في asyncio يسجل كل callback يتجاوز slow_callback_duration
+    asyncio_logger.addHandler(collector)
+    loop.slow_callback_duration = slow_callback_ms / 1000
+    loop.set_debug(True)
+
+    profiler = cProfile.Profile()
+    task_counts: list[int] = []
+    started_at = datetime.now()
+    profiler.enable()
+    try:
+        remaining = seconds
+        while remaining > 0:
+            task_counts.append(len(asyncio.all_tasks(loop)))
+            step = min(1.0, remaining)
+            await asyncio.sleep(step)
+            remaining -= step
+    finally:
+        profiler.disable()
+        loop.set_debug(previous_debug)
+        loop.slow_callback_duration = previous_slow_duration
+        asyncio_logger.removeHandler(collector)
+        snapshot_after = tracemalloc.take_snapshot()
+        if started_tracemalloc:
+            tracemalloc.stop()
+        _active = False
+
+    # ============================================
+    # 📝 بناء التقرير
+    # ============================================
+    report = io.StringIO()
+    report.write(f"Profile report - {started_at:%Y-%m-%d %H:%M:%S} - {seconds:g}s\n")
+    report.write("=" * 60 + "\n\n")
+
+    report.write("[CPU hot spots - sorted by cumulative time]\n")
+    stats = pstats.Stats(profiler, stream=report)
+    stats.strip_dirs().sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_FUNCTIONS)
+
+    report.write("\n[asyncio tasks]\n")
+    if task_counts:
+        report.write(
+            f"samples: {len(task_counts)} | min: {min(task_counts)} | "
+            f"max: {max(task_counts)} | avg: {sum(task_counts) / len(task_counts):.1f}\n"
+        )
+
+    report.write(f"\n[slow callbacks >= {slow_callback_ms:g} ms]\n")
+    if collector.messages:
+        for line in collector.messages:
+            report.write(line + "\n")
+    else:
+        report.write("none\n")
+
+    report.write(f"\n[top {TOP_ALLOCATIONS} allocation changes]\n")
+    for stat in snapshot_after.compare_to(snapshot_before, "lineno")[:TOP_ALLOCATIONS]:
+        report.write(f"{stat}\n")
+
+    return report.getvalue()
@@ -0,0 +1,174 @@
+# ============================================
+# ⏰ مجدول المهام - scheduler.py
+# مجدول asyncio داخل البوت مع كومة (min-heap) محفوظة على القرص
+# ============================================
+#
+# - كل مهمة لها معرف فريد (job_id)، ونوع (kind) مرتبط بدالة معالجة، وموعد (due).
+# - المجدول لا يستخدم حلقات انتظار دورية: ينام حتى موعد أقرب مهمة فقط،
+#   ويستيقظ مبكراً إذا أضيفت مهمة أقرب.
+# - تُحذف المهمة من الملف قبل تنفيذها، لذلك لا تُنفذ مرتين بعد إعادة التشغيل.
+# - دالة المعالجة يمكنها إرجاع موعد جديد (timestamp) لإعادة جدولة نفس المهمة.
+# - إذا فشلت دالة المعالجة يُعاد جدولة المهمة بعد retry_delay ثانية حتى لا تضيع.
+
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import time
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+# دالة المعالجة: (job_id, payload) -> موعد التشغيل التالي أو None
+JobHandler = Callable[[str, dict], Awaitable[float | None]]
+
+
+class JobScheduler:
+    """مجدول مهام بسيط يعمل داخل حلقة asyncio الخاصة بالبوت."""
+
+    def __init__(self, jobs_file: str, retry_delay: float = 60):
+        self.jobs_file = jobs_file
+        self.retry_delay = retry_delay
+        self._jobs: dict[str, dict] = {}
+        self._heap: list[tuple[float, int, str]] = []
+        self._counter = itertools.count()
+        self._handlers: dict[str, JobHandler] = {}
+        self._wakeup = asyncio.Event()
+        self._running = False
+
+    # ============================================
+    # 💾 الحفظ والتحميل
+    # ============================================
+
+    def load(self) -> None:
+        """تحميل المهام المحفوظة وإعادة بناء الكومة."""
+        if not os.path.exists(self.jobs_file):
+            return
+        try:
+            with open(self.jobs_file, "r", encoding="utf-8") as f:
+                self._jobs = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            logger.error("❌ خطأ في قراءة ملف المهام: %s", e)
+            self._jobs = {}
+        self._heap = [(job["due"], next(self._counter), job_id) for job_id, job in self._jobs.items()]
+        heapq.heapify(self._heap)
+
+    def _save(self) -> None:
+        """حفظ المهام بشكل ذري (ملف مؤقت ثم استبدال)."""
+        tmp_path = self.jobs_file + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._jobs, f, ensure_ascii=False)
+            os.replace(tmp_path, self.jobs_file)
+        except OSError as e:
+            logger.error("❌ خطأ في حفظ ملف المهام: %s", e)
+
+    # ============================================
+    # 📋 إدارة المهام
+    # ============================================
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        """ربط نوع مهمة بدالة المعالجة الخاصة به."""
+        self._handlers[kind] = handler
+
+    def has_job(self, job_id: str) -> bool:
+        """هل المهمة موجودة في الجدول؟"""
+        return job_id in self._jobs
+
+    def schedule(
+        self,
+        job_id: str,
+        kind: str,
+        due: float,
+        payload: dict | None = None,
+        replace: bool = False,
+    ) -> bool:
+        """
+        جدولة مهمة في الموعد due (timestamp).
+        إذا كانت المهمة موجودة مسبقاً لا يتم تغييرها إلا مع replace=True،
+        وبذلك يمكن استدعاء هذه الدالة عند كل تشغيل دون تكرار المهام.
+        """
+        if job_id in self._jobs and not replace:
+            return False
+        self._jobs[job_id] = {"kind": kind, "due": due, "payload": payload or {}}
+        heapq.heappush(self._heap, (due, next(self._counter), job_id))
+        self._save()
+        # إيقاظ الحلقة لإعادة حساب موعد أقرب مهمة
+        self._wakeup.set()
+        return True
+
+    def cancel(self, job_id: str) -> bool:
+        """إلغاء مهمة (تبقى في الكومة وتُتجاهل عند وصولها)."""
+        if self._jobs.pop(job_id, None) is None:
+            return False
+        self._save()
+        return True
+
+    def _peek(self) -> tuple[float, str] | None:
+        """أقرب مهمة صالحة، مع حذف العناصر الملغاة أو القديمة من رأس الكومة."""
+        while self._heap:
+            due, _, job_id = self._heap[0]
+            job = self._jobs.get(job_id)
+            if job is not None and job["due"] == due:
+                return due, job_id
+            heapq.heappop(self._heap)
+        return None
+
+    # ============================================
+    # 🔁 حلقة التشغيل
+    # ============================================
+
+    async def _fire(self, job_id: str) -> None:
+        """تنفيذ مهمة واحدة ثم إعادة جدولتها إذا طلبت دالة المعالجة ذلك."""
+        heapq.heappop(self._heap)
+        job = self._jobs.pop(job_id)
+        # الحذف من الملف قبل التنفيذ حتى لا تتكرر المهمة بعد إعادة التشغيل
+        self._save()
+
+        handler = self._handlers.get(job["kind"])
+        if handler is None:
+            logger.error("⚠️ لا توجد دالة معالجة لنوع المهمة: %s", job["kind"])
+            return
+
+        try:
+            next_due = await handler(job_id, job["payload"])
+        except Exception as e:
+            # خطأ مؤقت (مثل فشل الاتصال بتلغرام) لا يجب أن يلغي المهمة نهائياً
+            logger.error(
+                "❌ خطأ في تنفيذ المهمة %s: %s (إعادة المحاولة بعد %s ثانية)",
+                job_id,
+                e,
+                self.retry_delay,
+            )
+            next_due = time.time() + self.retry_delay
+
+        if next_due is not None:
+            self.schedule(job_id, job["kind"], next_due, job["payload"])
+
+    async def run(self) -> None:
+        """تشغيل المجدول حتى استدعاء stop()."""
+        self._running = True
+        logger.info("⏰ تم تشغيل المجدول (%s مهمة)", len(self._jobs))
+        while self._running:
+            self._wakeup.clear()
+            upcoming = self._peek()
+            timeout = None if upcoming is None else max(0.0, upcoming[0] - time.time())
+
+            if timeout != 0.0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                    # تمت إضافة مهمة جديدة أو طلب إيقاف: نعيد الحساب
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+
+            upcoming = self._peek()
+            if upcoming is not None and upcoming[0] <= time.time():
+                await self._fire(upcoming[1])
+
+    def stop(self) -> None:
+        """إيقاف حلقة المجدول."""
+        self._running = False
+        self._wakeup.set()
@@ -0,0 +1,280 @@
+# ============================================
+# 💾 صيغ حفظ قاعدة البيانات - serializers.py
+# ============================================
+#
+# الصيغ المدعومة:
+#   - json      : مكتبة json القياسية بتنسيق مقروء (الصيغة الافتراضية والقديمة)
+#   - fastjson  : orjson إن كانت مثبتة، وإلا json القياسية بدون مسافات
+#   - msgpack   : صيغة ثنائية مضغوطة (تتطلب مكتبة msgpack)
+#
+# الملفات بصيغة غير json تبدأ بسطر تعريف:  SBDB:<format>\n
+# ملفات json تبقى بدون سطر تعريف (تبدأ بـ "{") حتى تبقى متوافقة مع الملفات القديمة
+# وقابلة للقراءة والتعديل يدوياً.
+#
+# الاستخدام من سطر الأوامر:
+#   python serializers.py convert database.json database.db --to msgpack
+#   python serializers.py bench --count 50000
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from abc import ABC, abstractmethod
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+HEADER_PREFIX = b"SBDB:"
+
+
+class UnsupportedFormatError(RuntimeError):
+    """الصيغة غير معروفة أو مكتبتها غير مثبتة (الملف نفسه قد يكون سليماً)."""
+
+
+class CorruptDatabaseError(ValueError):
+    """الملف فارغ أو تالف ولا يمكن قراءته بصيغته."""
+
+
+class Serializer(ABC):
+    """واجهة صيغة الحفظ."""
+
+    name = ""
+    # هل تُكتب الملفات بسطر تعريف؟
+    header = True
+
+    def is_available(self) -> bool:
+        """هل المكتبات المطلوبة لهذه الصيغة مثبتة؟"""
+        return True
+
+    @abstractmethod
+    def dumps(self, data: dict) -> bytes:
+        """تحويل البيانات إلى bytes."""
+
+    @abstractmethod
+    def loads(self, payload: bytes) -> dict:
+        """قراءة البيانات من bytes."""
+
+
+class JsonSerializer(Serializer):
+    """json القياسية بتنسيق مقروء (مطابقة للملفات القديمة)."""
+
+    name = "json"
+    header = False
+
+    def dumps(self, data: dict) -> bytes:
+        return json.dumps(data, ensure_ascii=False, indent=4).encode("utf-8")
+
+    def loads(self, payload: bytes) -> dict:
+        return json.loads(payload.decode("utf-8"))
+
+
+class FastJsonSerializer(Serializer):
+    """orjson إن وجدت، وإلا json القياسية بدون مسافات ولا تهريب للأحرف العربية."""
+
+    name = "fastjson"
+
+    def dumps(self, data: dict) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(data)
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, payload: bytes) -> dict:
+        if orjson is not None:
+            return orjson.loads(payload)
+        return json.loads(payload.decode("utf-8"))
+
+
+class MsgpackSerializer(Serializer):
+    """صيغة msgpack الثنائية."""
+
+    name = "msgpack"
+
+    def is_available(self) -> bool:
+        return msgpack is not None
+
+    def dumps(self, data: dict) -> bytes:
+        return msgpack.packb(data, use_bin_type=True)
+
+    def loads(self, payload: bytes) -> dict:
+        return msgpack.unpackb(payload, raw=False)
+
+
+SERIALIZERS: dict[str, Serializer] = {
+    serializer.name: serializer
+    for serializer in (JsonSerializer(), FastJsonSerializer(), MsgpackSerializer())
+}
+
+
+def get_serializer(name: str) -> Serializer:
+    """الحصول على صيغة قابلة للاستخدام حسب الاسم."""
+    serializer = SERIALIZERS.get(name)
+    if serializer is None:
+        raise UnsupportedFormatError(f"unknown database format: {name!r}")
+    if not serializer.is_available():
+        raise UnsupportedFormatError(f"{name} format requires the {name!r} package")
+    return serializer
+
+
+def available_formats() -> list[str]:
+    """الصيغ القابلة للاستخدام في البيئة الحالية."""
+    return [name for name, serializer in SERIALIZERS.items() if serializer.is_available()]
+
+
+def ensure_format_available(fmt: str) -> None:
+    """التأكد عند التشغيل من أن صيغة الحفظ المحددة قابلة للاستخدام."""
+    get_serializer(fmt)
+
+
+# ============================================
+# 📄 قراءة وكتابة الملفات
+# ============================================
+
+def dump_bytes(data: dict, fmt: str) -> bytes:
+    """تحويل البيانات إلى bytes مع سطر التعريف إن لزم."""
+    serializer = get_serializer(fmt)
+    payload = serializer.dumps(data)
+    if serializer.header:
+        return HEADER_PREFIX + serializer.name.encode("ascii") + b"\n" + payload
+    return payload
+
+
+def load_bytes(raw: bytes) -> dict:
+    """
+    قراءة البيانات مع التعرف على الصيغة من سطر التعريف (أو json إن لم يوجد).
+    - UnsupportedFormatError: الصيغة غير معروفة أو مكتبتها غير مثبتة.
+    - CorruptDatabaseError: الملف فارغ أو تالف.
+    """
+    if not raw.strip():
+        raise CorruptDatabaseError("database file is empty")
+
+    if raw.startswith(HEADER_PREFIX):
+        header, _, payload = raw.partition(b"\n")
+        name = header[len(HEADER_PREFIX):].decode("ascii", errors="replace")
+        serializer = get_serializer(name)
+    else:
+        serializer, payload = SERIALIZERS["json"], raw
+
+    try:
+        data = serializer.loads(payload)
+    except Exception as e:
+        raise CorruptDatabaseError(f"cannot decode {serializer.name} database: {e}") from e
+    if not isinstance(data, dict):
+        raise CorruptDatabaseError("database root must be an object")
+    return data
+
+
+def save_file(path: str, data: dict, fmt: str) -> None:
+    """حفظ البيانات في ملف بشكل ذري (ملف مؤقت ثم استبدال)."""
+    raw = dump_bytes(data, fmt)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(raw)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_file(path: str) -> dict:
+    """قراءة ملف بأي صيغة مدعومة."""
+    with open(path, "rb") as f:
+        return load_bytes(f.read())
+
+
+# ============================================
+# 🔧 أدوات سطر الأوامر: التحويل وقياس الأداء
+# ============================================
+
+def convert(src: str, dst: str, fmt: str) -> None:
+    """تحويل ملف قاعدة بيانات من أي صيغة إلى الصيغة fmt."""
+    save_file(dst, load_file(src), fmt)
+
+
+def make_synthetic_database(count: int) -> dict:
+    """قاعدة بيانات تجريبية بعدد count طلب ونصوص عربية."""
+    rng = random.Random(0)
+    names = ["محمد أحمد علي", "فاطمة حسن محمود", "عمر خالد يوسف", "سارة إبراهيم سعيد"]
+    subjects = ["رياضيات، فيزياء", "كيمياء، أحياء", "لغة إنجليزية", "برمجة، رياضيات"]
+    statuses = ["pending", "accepted", "rejected"]
+    requests = {}
+    for i in range(count):
+        has_english = rng.random() < 0.4
+        requests[f"REQ_{7000000000 + i}_{1700000000 + i}"] = {
+            "student_name": rng.choice(names),
+            "student_number": str(rng.randint(100000, 999999)),
+            "telegram_username": f"@student{i}",
+            "device_id": f"DEV-{rng.getrandbits(48):012x}",
+            "subjects": rng.choice(subjects),
+            "codes_count": rng.randint(1, 6),
+            "has_english_codes": has_english,
+            "english_codes_count": rng.randint(1, 3) if has_english else 0,
+            "notes": "لا يوجد",
+            "submitter_id": 7857570699,
+            "submitter_name": "مشرف الطلبات",
+            "submitter_username": "@operator",
+            "timestamp": "2026-02-01 | 10:00:00",
+            "status": rng.choice(statuses),
+            "channel_message_id": 1000 + i,
+            "delivery": "sent",
+            "rendered_status": "pending",
+        }
+    return {
+        "statistics": {"accepted_students": 0, "total_codes": 0, "total_english_codes": 0},
+        "requests": requests,
+    }
+
+
+def benchmark(count: int, repeat: int) -> None:
+    """مقارنة زمن الحفظ والتحميل وحجم الملف لكل صيغة متاحة."""
+    data = make_synthetic_database(count)
+    print(f"synthetic database: {count} requests, best of {repeat}")
+    if orjson is None:
+        print("note: orjson not installed, fastjson uses the stdlib fallback")
+    print(f"{'format':<10} {'save (s)':>10} {'load (s)':>10} {'size (MB)':>10}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for fmt in available_formats():
+            path = os.path.join(tmp_dir, f"db.{fmt}")
+            save_times, load_times = [], []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                save_file(path, data, fmt)
+                save_times.append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                load_file(path)
+                load_times.append(time.perf_counter() - started)
+            size_mb = os.path.getsize(path) / (1024 * 1024)
+            print(f"{fmt:<10} {min(save_times):>10.3f} {min(load_times):>10.3f} {size_mb:>10.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Database format tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert_parser = commands.add_parser("convert", help="convert a database file between formats")
+    convert_parser.add_argument("src")
+    convert_parser.add_argument("dst")
+    convert_parser.add_argument("--to", required=True, choices=sorted(SERIALIZERS))
+
+    bench_parser = commands.add_parser("bench", help="benchmark formats on a synthetic database")
+    bench_parser.add_argument("--count", type=int, default=50000)
+    bench_parser.add_argument("--repeat", type=int, default=3)
+
+    args = parser.parse_args()
+    if args.command == "convert":
+        convert(args.src, args.dst, args.to)
+    else:
+        benchmark(args.count, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# ============================================
+# 🔎 استعلام الطلاب عن حالة طلباتهم - status_lookup.py
+# فهرس حالات في الذاكرة + تحديد معدل الاستعلام لكل مستخدم
+# ============================================
+#
+# الاستعلامات تُخدم من الذاكرة فقط ولا تقرأ database.json.
+# الفهرس يُبنى مرة واحدة عند التشغيل، ثم يُحدث عند إنشاء طلب أو قبوله أو رفضه،
+# ويتم إبطال الرد الجاهز المخزن لرقم الطالب المتأثر فقط.
+
+import time
+from collections import OrderedDict
+
+# تحويل الأرقام العربية والفارسية إلى أرقام لاتينية
+_DIGITS = str.maketrans("٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹", "01234567890123456789")
+
+STATUS_LABELS = {
+    "pending": "⏳ قيد المراجعة",
+    "accepted": "✅ مقبول",
+    "rejected": "❌ مرفوض",
+}
+
+NOT_FOUND_REPLY = "🔎 لا توجد طلبات مسجلة بهذا الرقم."
+
+
+def normalize_student_number(text: str) -> str:
+    """توحيد رقم الطالب (أرقام لاتينية بدون مسافات)."""
+    return text.strip().translate(_DIGITS).replace(" ", "")
+
+
+def is_student_number(text: str | None) -> bool:
+    """هل النص رقم طالب صالح للاستعلام؟"""
+    return bool(text) and normalize_student_number(text).isdigit()
+
+
+class StatusIndex:
+    """فهرس: رقم الطالب -> طلباته (الحالة والتاريخ فقط)."""
+
+    def __init__(self):
+        self._by_number: dict[str, dict[str, tuple[str, str]]] = {}
+        self._replies: dict[str, str] = {}
+
+    def build(self, requests) -> None:
+        """بناء الفهرس من (request_id, request_data)."""
+        self._by_number.clear()
+        self._replies.clear()
+        for request_id, request_data in requests:
+            self.upsert(request_id, request_data)
+
+    def upsert(self, request_id: str, request_data: dict) -> None:
+        """إضافة أو تحديث طلب في الفهرس وإبطال الرد المخزن لصاحبه."""
+        number = normalize_student_number(str(request_data.get("student_number", "")))
+        if not number:
+            return
+        entries = self._by_number.setdefault(number, {})
+        entries[request_id] = (request_data.get("timestamp", ""), request_data["status"])
+        self._replies.pop(number, None)
+
+    def reply_for(self, text: str) -> str:
+        """
+        نص الرد على استعلام رقم طالب (مخزن حتى يتغير أحد طلباته).
+        الأرقام غير المسجلة لا تُخزن حتى لا يكبر الكاش مع كل رقم عشوائي يُرسل.
+        """
+        number = normalize_student_number(text)
+        reply = self._replies.get(number)
+        if reply is not None:
+            return reply
+
+        entries = self._by_number.get(number)
+        if not entries:
+            return NOT_FOUND_REPLY
+
+        lines = [f"🔎 <b>حالة طلبات الرقم {number}</b>\n"]
+        for timestamp, status in sorted(entries.values()):
+            lines.append(f"📨 {timestamp}: <b>{STATUS_LABELS.get(status, status)}</b>")
+        reply = "\n".join(lines)
+        self._replies[number] = reply
+        return reply
+
+
+class UserRateLimiter:
+    """
+    تحديد عدد الاستعلامات لكل مستخدم خلال فترة زمنية (نافذة ثابتة).
+    النوافذ مرتبة حسب وقت بدايتها، فالمنتهية منها تكون دائماً في البداية
+    وتُحذف من هناك بتكلفة ثابتة لكل استعلام.
+    """
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self._windows: OrderedDict[int, list] = OrderedDict()
+
+    def hit(self, user_id: int) -> int:
+        """تسجيل استعلام وإرجاع ترتيبه داخل النافذة الحالية (1 = الأول)."""
+        now = time.monotonic()
+        while self._windows:
+            started, _ = next(iter(self._windows.values()))
+            if now - started < self.window:
+                break
+            self._windows.popitem(last=False)
+
+        window = self._windows.get(user_id)
+        if window is None:
+            self._windows[user_id] = [now, 1]
+            return 1
+        window[1] += 1
+        return window[1]